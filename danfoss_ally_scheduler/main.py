@@ -1,9 +1,4 @@
 from argparse import ArgumentParser
-from dataclasses import dataclass
-from typing import List, Dict, Optional 
-
-from danfoss_ally_scheduler.mqtt_config import MQTTConfig
-from danfoss_ally_scheduler.thermostat_manager import ThermostatManager
 
 
 def main():
@@ -14,7 +9,12 @@ def main():
                        help='Path to configuration file (optional)')
     args = parser.parse_args()
 
+    manager = None
     try:
+        # Imported after parsing arguments so --help doesn't load yaml and paho
+        from danfoss_ally_scheduler.mqtt_config import MQTTConfig
+        from danfoss_ally_scheduler.thermostat_manager import ThermostatManager
+
         config = MQTTConfig.from_yaml()
         manager = ThermostatManager(config)
         
@@ -26,6 +26,9 @@ def main():
         print("\nProgram terminated by user.")
     except Exception as e:
         print(f"An error occurred: {e}")
+    finally:
+        if manager is not None:
+            manager.disconnect()
 
 
 if __name__ == "__main__":
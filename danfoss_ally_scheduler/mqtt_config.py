@@ -1,10 +1,14 @@
-from dataclasses import dataclass
-import yaml
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
+from danfoss_ally_scheduler.yaml_cache import load_yaml_cached, safe_load
 
-@dataclass
+if TYPE_CHECKING:
+    import ssl
+
+
+@dataclass(slots=True)
 class MQTTConfig:
     """MQTT connection configuration.
     
@@ -19,6 +23,8 @@ class MQTTConfig:
         ca_certs: Path to CA certificates for TLS
         certfile: Path to client certificate for TLS
         keyfile: Path to client key for TLS
+        expected_count: Number of thermostats to wait for during discovery,
+            by default discovery ends with the first device list received
     """
     broker: str
     port: int
@@ -30,6 +36,8 @@ class MQTTConfig:
     ca_certs: Optional[str] = None
     certfile: Optional[str] = None
     keyfile: Optional[str] = None
+    expected_count: Optional[int] = None
+    _ssl_context: Optional['ssl.SSLContext'] = field(default=None, init=False, repr=False, compare=False)
 
     @classmethod
     def from_yaml(cls, config_path: Optional[Path] = None) -> 'MQTTConfig':
@@ -44,12 +52,22 @@ class MQTTConfig:
         if config_path is None:
             config_path = Path.home() / '.danfoss_ally' / 'config.yaml'
             
-        with open(config_path) as f:
-            config = yaml.safe_load(f)['mqtt']
+        config = load_yaml_cached(config_path, safe_load)['mqtt']
             
         return cls(**config) 
 
 
+    @property
+    def ssl_context(self) -> 'ssl.SSLContext':
+        """SSL context for TLS, built once so the PEM files are read only once."""
+        if self._ssl_context is None:
+            import ssl
+            context = ssl.create_default_context(cafile=self.ca_certs)
+            if self.certfile:
+                context.load_cert_chain(self.certfile, self.keyfile)
+            self._ssl_context = context
+        return self._ssl_context
+
     def validate(self) -> None:
         """Validates the MQTT configuration."""
         if not all([self.broker, self.port, self.user, self.password]):
@@ -1,17 +1,36 @@
 import json
 from pathlib import Path
+import sys
+import threading
 import time
-from typing import List, Optional, Dict
-import yaml
+from typing import List, Optional, Dict, Tuple, TYPE_CHECKING
 
-from paho.mqtt import client as mqtt_client
+# orjson is optional, it parses and serializes several times faster and
+# produces bytes that can be published as they are
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    from json import dumps as json_dumps, loads as json_loads
 
 from danfoss_ally_scheduler.mqtt_config import MQTTConfig
+from danfoss_ally_scheduler.yaml_cache import iter_yaml_cached, safe_dump, safe_load_all
+
+if TYPE_CHECKING:
+    from paho.mqtt import client as mqtt_client
 
 
 MINIMUM_TEMPERATURE = 5.0
 MAXIMUM_TEMPERATURE = 35.0
 ALLOWED_TEMPERATURE_STEP = 0.5
+CONNECT_TIMEOUT = 5
+DISCOVERY_TIMEOUT = 2
+PUBLISH_TIMEOUT = 5
+
+
+def _is_int(text: str) -> bool:
+    """Checks whether int() would parse the text, including a leading sign."""
+    digits = text[1:] if text[:1] in ("+", "-") else text
+    return digits.isdecimal()
 
 
 class ThermostatManager:
@@ -19,6 +38,7 @@ class ThermostatManager:
     
     MODEL = '014G2461'
     DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    _DAY_BITS = {day: 1 << i for i, day in enumerate(DAYS)}
 
     def __init__(self, mqtt_config: MQTTConfig, dry_run: bool = False):
         """Initialize ThermostatManager.
@@ -29,75 +49,109 @@ class ThermostatManager:
         """
         self.mqtt_config = mqtt_config
         self.dry_run = dry_run
-        self.client: Optional[mqtt_client.Client] = None
+        self.client: Optional['mqtt_client.Client'] = None
         self.thermostats: List[str] = []
+        self._topic_cache: Dict[str, str] = {}
         if not dry_run:
             self._connect_mqtt()
             self.fetch_thermostats()
 
     def _connect_mqtt(self) -> None:
         """Connects to MQTT broker with TLS support."""
+        # paho pulls in ssl, socket and selectors, only import it when connecting
+        from paho.mqtt import client as mqtt_client
+
         try:
             self.mqtt_config.validate()
             
-            self.client = mqtt_client.Client()
+            self.client = mqtt_client.Client(
+                callback_api_version=mqtt_client.CallbackAPIVersion.VERSION2,
+                protocol=mqtt_client.MQTTv5
+            )
             self.client.username_pw_set(self.mqtt_config.user, self.mqtt_config.password)
             
             if self.mqtt_config.use_tls:
-                self.client.tls_set(
-                    ca_certs=self.mqtt_config.ca_certs,
-                    certfile=self.mqtt_config.certfile,
-                    keyfile=self.mqtt_config.keyfile
-                )
+                self.client.tls_set_context(self.mqtt_config.ssl_context)
             
+            connected = threading.Event()
+
             # Add callbacks for connection
-            def on_connect(client, userdata, flags, rc):
-                if rc == 0:
+            def on_connect(client, userdata, flags, reason_code, properties):
+                if not reason_code.is_failure:
                     print("Connected to MQTT broker")
                 else:
-                    raise ConnectionError(f"Failed to connect to MQTT broker: {rc}")
+                    print(f"Failed to connect to MQTT broker: {reason_code}")
+                connected.set()
+
+            def on_connect_fail(client, userdata):
+                connected.set()
                 
-            def on_disconnect(client, userdata, rc):
-                print(f"Disconnected from MQTT broker: {rc}")
+            def on_disconnect(client, userdata, flags, reason_code, properties):
+                print(f"Disconnected from MQTT broker: {reason_code}")
             
             self.client.on_connect = on_connect
+            self.client.on_connect_fail = on_connect_fail
             self.client.on_disconnect = on_disconnect
             
-            # Try to connect with timeout
-            self.client.connect(self.mqtt_config.broker, self.mqtt_config.port)
+            # Connect in the network thread and wait for the CONNACK
+            self.client.connect_async(self.mqtt_config.broker, self.mqtt_config.port)
             self.client.loop_start()
-            time.sleep(2)  # Wait for connection
+            connected.wait(timeout=CONNECT_TIMEOUT)
             
             if not self.client.is_connected():
                 raise ConnectionError("Failed to connect to MQTT broker")
             
         except Exception as e:
+            if self.client is not None:
+                self.client.loop_stop()
             self.client = None
             raise ConnectionError(f"MQTT connection failed: {str(e)}")
     
+    def disconnect(self) -> None:
+        """Disconnects from MQTT broker and stops the network loop."""
+        if self.client is not None:
+            self.client.disconnect()
+            self.client.loop_stop()
+            self.client = None
+
     def fetch_thermostats(self) -> None:
         """Fetch thermostats from MQTT."""
+        discovered = threading.Event()
+        # Set mirror of self.thermostats for O(1) duplicate checks, the list keeps the order
+        known_thermostats = set(self.thermostats)
+
         def on_message(_, __, msg):
             try:
-                devices = json.loads(msg.payload)
+                devices = json_loads(msg.payload)
                 for device in devices:
                     if device.get('definition', {}).get('model') == self.MODEL:
                         device_id = device.get('friendly_name')
-                        if device_id and device_id not in self.thermostats:
+                        if device_id and device_id not in known_thermostats:
+                            known_thermostats.add(device_id)
                             self.thermostats.append(device_id)
                 print(f"Found {len(self.thermostats)} thermostats")
+                expected_count = self.mqtt_config.expected_count
+                if expected_count is None or len(self.thermostats) >= expected_count:
+                    discovered.set()
             except json.JSONDecodeError:
                 print("JSON decoding error from MQTT")
             except Exception as e:
                 print(f"An error occurred while fetching thermostats: {str(e)}")
 
-        self.client.subscribe(self.mqtt_config.topic_discovery)
+        # The device list is retained, so it arrives right after subscribing
         self.client.on_message = on_message
-        self.client.loop_start()
-        time.sleep(2)
-        self.client.loop_stop()
+        self.client.subscribe(self.mqtt_config.topic_discovery)
+        discovered.wait(timeout=DISCOVERY_TIMEOUT)
         self.client.unsubscribe(self.mqtt_config.topic_discovery)
         self.client.on_message = None
+        self._topic_cache = {thermostat: self.mqtt_config.topic_set.format(thermostat) for thermostat in self.thermostats}
+
+    def _get_topic(self, thermostat: str) -> str:
+        """Returns the set topic for a thermostat, formatting it only once."""
+        topic = self._topic_cache.get(thermostat)
+        if topic is None:
+            topic = self._topic_cache[thermostat] = self.mqtt_config.topic_set.format(thermostat)
+        return topic
 
     def configure_schedule(self) -> None:
         """Configure schedule for selected thermostats and days."""
@@ -126,10 +180,14 @@ class ThermostatManager:
             
             remaining_days -= set(selected_days)
             
-            print("\nReport:")
-            print(f"Configured days: {', '.join(selected_days)}")
-            print(f"For thermostats: {', '.join(selected_thermostats)}")
-            print("Schedule:", json.dumps(schedule, indent=2))
+            # The payload was already logged while sending, report the schedule in short form
+            sys.stdout.write(
+                "\nReport:\n"
+                f"Configured days: {', '.join(selected_days)}\n"
+                f"For thermostats: {', '.join(selected_thermostats)}\n"
+                "Schedule:\n"
+                + "".join(f"  {entry['time']}: {entry['temperature']}°C\n" for entry in schedule)
+            )
 
         self.save_schedule_to_yaml(schedule, selected_days, selected_thermostats)
 
@@ -141,16 +199,29 @@ class ThermostatManager:
             time_input = input("Time (HH:MM): ").strip()
             if time_input == "":
                 break
-            try:
-                temp_input = input("Temperature (°C): ").strip()
-                schedule.append(self._parse_schedule_entry(time_input, temp_input))
-            except ValueError:
+            temp_input = input("Temperature (°C): ").strip()
+            entry = self._parse_schedule_entry(time_input, temp_input)
+            if entry is None:
                 print("Invalid format. Try again.")
+                continue
+            schedule.append(entry)
         return schedule
 
-    def _parse_schedule_entry(self, time_input: str, temperature_input: str) -> Dict:
+    def _parse_schedule_entry(self, time_input: str, temperature_input: str) -> Optional[Dict]:
         """Parses a single schedule entry.
         
+        Args:
+            time_input: Time in HH:MM format
+            temperature_input: Temperature value as string
+        
+        Returns:
+            Dict containing parsed schedule entry, None when input is invalid
+        """
+        return self._check_schedule_entry(time_input, temperature_input)[0]
+
+    def _parse_schedule_entry_strict(self, time_input: str, temperature_input: str) -> Dict:
+        """Parses a single schedule entry, raising on invalid input.
+        
         Args:
             time_input: Time in HH:MM format
             temperature_input: Temperature value as string
@@ -161,32 +232,53 @@ class ThermostatManager:
         Raises:
             ValueError: When input format is invalid or values are out of range
         """
+        entry, error = self._check_schedule_entry(time_input, temperature_input)
+        if entry is None:
+            raise ValueError(error)
+        return entry
+
+    def _check_schedule_entry(self, time_input: str, temperature_input: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """Validates a single schedule entry without raising exceptions.
+        
+        Args:
+            time_input: Time in HH:MM format
+            temperature_input: Temperature value as string
+        
+        Returns:
+            Tuple of parsed schedule entry and None, or None and an error message
+        """
+        hour, separator, minute = (part.strip() for part in time_input.partition(":"))
+        if not (separator and _is_int(hour) and _is_int(minute)):
+            return None, "Invalid input format"
+        hour, minute = int(hour), int(minute)
+        
+        # Time validation
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            return None, "Time must be in format HH:MM (00:00-23:59)"
+        
+        # Temperature validation
         try:
-            hour, minute = map(int, time_input.split(":"))
-            
-            # Time validation
-            if not (0 <= hour <= 23 and 0 <= minute <= 59):
-                raise ValueError("Time must be in format HH:MM (00:00-23:59)")
-            
-            # Temperature validation
             temperature = float(temperature_input)
+        except ValueError:
+            return None, "Invalid input format"
 
-            if not (MINIMUM_TEMPERATURE <= temperature <= MAXIMUM_TEMPERATURE):
-                raise ValueError(f"Temperature must be between {MINIMUM_TEMPERATURE}°C and {MAXIMUM_TEMPERATURE}°C")
-            
-            if temperature % ALLOWED_TEMPERATURE_STEP != 0:
-                raise ValueError(f"Temperature must be a multiple of {ALLOWED_TEMPERATURE_STEP}°C")
-            
-            return {
-                "time": f"{hour:02d}:{minute:02d}",
-                "transitionTime": hour * 60 + minute,
-                "heatSetpoint": int(temperature * 100),
-                "temperature": temperature
-            }
-        except ValueError as e:
-            if "Time must be in format" not in str(e):
-                raise ValueError("Invalid input format")
-            raise
+        if not (MINIMUM_TEMPERATURE <= temperature <= MAXIMUM_TEMPERATURE):
+            return None, "Invalid input format"
+        
+        # Setpoints are in hundredths of a degree. Reject anything finer than
+        # that, then check the step on integers to avoid float modulo errors
+        heat_setpoint = round(temperature * 100)
+        if abs(temperature * 100 - heat_setpoint) > 1e-6:
+            return None, "Invalid input format"
+        if heat_setpoint % round(ALLOWED_TEMPERATURE_STEP * 100) != 0:
+            return None, "Invalid input format"
+        
+        return {
+            "time": f"{hour:02d}:{minute:02d}",
+            "transitionTime": hour * 60 + minute,
+            "heatSetpoint": heat_setpoint,
+            "temperature": temperature
+        }, None
 
     def _select_days(self, remaining_days: set) -> List[str]:
         """Allows user to select days of the week.
@@ -204,13 +296,12 @@ class ThermostatManager:
             if not selection:
                 return []
             
-            selected_indices = [int(x.strip()) - 1 for x in selection.split(",")]
-            selected_days = []
-            for i in selected_indices:
-                if 0 <= i < len(self.DAYS) and self.DAYS[i] in remaining_days:
-                    selected_days.append(self.DAYS[i])
-                else:
-                    print(f"Invalid day index: {i}")
+            selected_indices = [int(x) - 1 for x in selection.split(",")]
+            valid_indices = {i for i, day in enumerate(self.DAYS) if day in remaining_days}
+            selected_days = [self.DAYS[i] for i in selected_indices if i in valid_indices]
+            invalid_numbers = [str(i + 1) for i in selected_indices if i not in valid_indices]
+            if invalid_numbers:
+                print(f"Invalid day numbers: {', '.join(invalid_numbers)}")
             return selected_days
         except (ValueError, IndexError):
             print("Invalid format. Try again.")
@@ -247,12 +338,16 @@ class ThermostatManager:
         Returns:
             Dict: Prepared payload for MQTT 
         """
+        dayofweek = 0
+        for day in selected_days:
+            dayofweek |= self._DAY_BITS[day]
+
         return {
             "command": {
                 "cluster": 513,
                 "command": 1,
                 "payload": {
-                    "dayofweek": sum(1 << self.DAYS.index(day) for day in selected_days),
+                    "dayofweek": dayofweek,
                     "mode": 1,
                     "numoftrans": len(schedule),
                     "transitions": schedule
@@ -262,18 +357,25 @@ class ThermostatManager:
 
     def _send_schedule_to_thermostats(self, selected_thermostats: List[str], payload: Dict) -> None:
         """Sends schedule to selected thermostats."""
-        for thermostat in selected_thermostats:
-            topic = self.mqtt_config.topic_set.format(thermostat)
-            payload_json = json.dumps(payload, indent=2)
-            
+        payload_json = json_dumps(payload)
+        topics = [(thermostat, self._get_topic(thermostat)) for thermostat in selected_thermostats]
+
+        for thermostat, topic in topics:
             print(f"{'[DRY-RUN] ' if self.dry_run else ''}Sending schedule to {thermostat}")
             print(f"Topic: {topic}")
-            print(f"Payload: {payload_json}")
-            
-            # Zawsze wywołujemy publish, nawet w trybie dry-run
-            message_info = self.client.publish(topic, payload_json)
-            
-            if not self.dry_run:
+        print(f"Payload: {json.dumps(payload, indent=2)}")
+
+        # Zawsze wywołujemy publish, nawet w trybie dry-run.
+        # Publishing back-to-back lets the writes coalesce into fewer TCP sends.
+        messages = [(thermostat, self.client.publish(topic, payload_json)) for thermostat, topic in topics]
+
+        if not self.dry_run:
+            # The network thread writes the queued messages, wait until it has sent them
+            for thermostat, message_info in messages:
+                try:
+                    message_info.wait_for_publish(timeout=PUBLISH_TIMEOUT)
+                except (ValueError, RuntimeError):
+                    pass
                 if not message_info.is_published():
                     print(f"Failed to send schedule to {thermostat}")
 
@@ -303,7 +405,7 @@ class ThermostatManager:
         
         with open(config_file, 'a') as f:
             f.write('\n---\n')  # Separator for multiple YAML documents
-            yaml.dump(config_data, f, allow_unicode=True, sort_keys=False)
+            safe_dump(config_data, f, allow_unicode=True, sort_keys=False)
             
         print(f"\nConfiguration saved to: {config_file}")
 
@@ -313,18 +415,13 @@ class ThermostatManager:
             config_file = Path.home() / '.danfoss_ally' / 'schedule_config.yaml'
         
         try:
-            with open(config_file, 'r') as f:
-                configs = list(yaml.safe_load_all(f))
-            
-            for config in configs:
+            # Documents are applied as they are read, without loading the whole file
+            for config in iter_yaml_cached(config_file, safe_load_all):
                 # Convert human-readable format to thermostat format
-                schedule = []
-                for entry in config['schedule']:
-                    hour, minute = map(int, entry['time'].split(':'))
-                    schedule.append({
-                        'transitionTime': hour * 60 + minute,
-                        'heatSetpoint': int(entry['temperature'] * 100)
-                    })
+                schedule = [{
+                    'transitionTime': int(hour) * 60 + int(minute),
+                    'heatSetpoint': round(entry['temperature'] * 100)
+                } for entry in config['schedule'] for hour, _, minute in (entry['time'].partition(':'),)]
                 
                 payload = self._prepare_schedule_payload(schedule, config['days'])
                 self._send_schedule_to_thermostats(config['thermostats'], payload)
@@ -0,0 +1,172 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, IO, Iterable, Iterator, Optional, Union
+
+
+CACHE_SUFFIX = '.cache.json'
+STREAM_CACHE_SUFFIX = '.cache.jsonl'
+
+
+# yaml is imported on first use, so a sidecar cache hit doesn't pay for it.
+# The libyaml C bindings are preferred, they are several times faster than pure Python.
+def safe_load(stream: IO) -> Any:
+    """Parses a single YAML document."""
+    import yaml
+    return yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def safe_load_all(stream: IO) -> Iterator[Any]:
+    """Lazily parses all YAML documents of a stream."""
+    import yaml
+    return yaml.load_all(stream, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def safe_dump(data: Any, stream: IO, **kwargs) -> None:
+    """Writes data as a YAML document."""
+    import yaml
+    yaml.dump(data, stream, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper), **kwargs)
+
+
+def cache_path_for(path: Union[str, Path], suffix: str = CACHE_SUFFIX) -> Path:
+    """Returns the path of the JSON sidecar cache for a YAML file."""
+    path = Path(path)
+    return path.with_name(path.name + suffix)
+
+
+def _is_fresh(cached: dict, stat: os.stat_result) -> bool:
+    """Checks whether a sidecar was written for the current YAML file contents."""
+    return cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size
+
+
+def _create_private(path: Path, stat: os.stat_result) -> IO:
+    """Creates a file with the permissions of the YAML file it caches.
+
+    The sidecar holds the same data as the YAML file, e.g. the MQTT password,
+    so it is created with the restricted mode right away instead of being
+    chmod-ed after writing. Any leftover file is removed first because an
+    existing file would keep its own permissions.
+    """
+    path.unlink(missing_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, stat.st_mode & 0o777)
+    return os.fdopen(fd, 'w')
+
+
+def load_yaml_cached(path: Union[str, Path], load: Callable[[IO], Any]) -> Any:
+    """Loads a YAML file, reusing a JSON sidecar cache when it is up to date.
+
+    The sidecar stores the parsed data together with the mtime and size of
+    the YAML file, so any modification of the YAML file invalidates it.
+
+    Args:
+        path: Path to the YAML file
+        load: Function parsing an open YAML file into JSON-serializable data
+
+    Returns:
+        Parsed data
+
+    Raises:
+        FileNotFoundError: When the YAML file does not exist
+    """
+    path = Path(path)
+    stat = os.stat(path)
+    cache_path = cache_path_for(path)
+
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if _is_fresh(cached, stat):
+            return cached['data']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    with open(path) as f:
+        data = load(f)
+
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    try:
+        cached_json = json.dumps({'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'data': data})
+        with _create_private(tmp_path, stat) as f:
+            f.write(cached_json)
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        # Caching is best effort, the YAML file stays the source of truth
+        try:
+            tmp_path.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    return data
+
+
+def iter_yaml_cached(path: Union[str, Path], load_all: Callable[[IO], Iterable[Any]]) -> Iterator[Any]:
+    """Iterates over the documents of a YAML file, reusing a JSON Lines sidecar cache.
+
+    Documents are yielded one at a time both from the YAML file and from the
+    sidecar, so only a single document is held in memory. The sidecar starts
+    with a line holding the mtime and size of the YAML file, followed by one
+    line per document. It is written under a temporary name and only moved
+    in place once every document has been read.
+
+    Args:
+        path: Path to the YAML file
+        load_all: Function lazily parsing an open YAML file into JSON-serializable documents
+
+    Yields:
+        Parsed documents
+
+    Raises:
+        FileNotFoundError: When the YAML file does not exist
+    """
+    path = Path(path)
+    stat = os.stat(path)
+    cache_path = cache_path_for(path, STREAM_CACHE_SUFFIX)
+
+    try:
+        cache = open(cache_path)
+    except OSError:
+        cache = None
+    if cache is not None:
+        with cache:
+            try:
+                fresh = _is_fresh(json.loads(cache.readline()), stat)
+            except (ValueError, KeyError, TypeError):
+                fresh = False
+            if fresh:
+                for line in cache:
+                    yield json.loads(line)
+                return
+
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    tmp: Optional[IO] = None
+    try:
+        tmp = _create_private(tmp_path, stat)
+        tmp.write(json.dumps({'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}) + '\n')
+    except OSError:
+        pass
+
+    try:
+        with open(path) as f:
+            for document in load_all(f):
+                if tmp is not None:
+                    try:
+                        tmp.write(json.dumps(document) + '\n')
+                    except (OSError, TypeError, ValueError):
+                        # Caching is best effort, the YAML file stays the source of truth
+                        tmp.close()
+                        tmp = None
+                        tmp_path.unlink(missing_ok=True)
+                yield document
+
+        if tmp is not None:
+            tmp.close()
+            try:
+                os.replace(tmp_path, cache_path)
+                tmp = None
+            except OSError:
+                pass
+    finally:
+        # Left over when the documents were not fully read or the sidecar could not be moved
+        if tmp is not None:
+            tmp.close()
+            tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,45 @@
+import pytest
+from unittest.mock import patch
+from danfoss_ally_scheduler.mqtt_config import MQTTConfig
+
+
+def test_from_yaml(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("""
+mqtt:
+  broker: test.broker
+  port: 1883
+  user: test_user
+  password: test_pass
+  topic_discovery: zigbee2mqtt/bridge/devices
+  topic_set: zigbee2mqtt/{}/set
+""")
+
+    config = MQTTConfig.from_yaml(config_file)
+
+    assert config == MQTTConfig(
+        broker="test.broker",
+        port=1883,
+        user="test_user",
+        password="test_pass",
+        topic_discovery="zigbee2mqtt/bridge/devices",
+        topic_set="zigbee2mqtt/{}/set"
+    )
+
+
+def test_config_has_no_instance_dict():
+    config = MQTTConfig("test.broker", 1883, "test_user", "test_pass", "discovery", "set")
+    assert not hasattr(config, "__dict__")
+    with pytest.raises(AttributeError):
+        config.unknown = True
+
+
+def test_ssl_context_is_built_once():
+    config = MQTTConfig(
+        "test.broker", 8883, "test_user", "test_pass", "discovery", "set",
+        use_tls=True, ca_certs="ca.pem", certfile="client.pem", keyfile="client.key"
+    )
+    with patch('ssl.create_default_context') as mock_create:
+        assert config.ssl_context is config.ssl_context
+        mock_create.assert_called_once_with(cafile="ca.pem")
+        mock_create.return_value.load_cert_chain.assert_called_once_with("client.pem", "client.key")
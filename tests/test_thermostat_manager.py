@@ -1,6 +1,7 @@
+import json
 import pytest
 from unittest.mock import Mock, patch
-from danfoss_ally_scheduler.thermostat_manager import ThermostatManager, MINIMUM_TEMPERATURE, MAXIMUM_TEMPERATURE, ALLOWED_TEMPERATURE_STEP
+from danfoss_ally_scheduler.thermostat_manager import ThermostatManager, json_dumps, MINIMUM_TEMPERATURE, MAXIMUM_TEMPERATURE, ALLOWED_TEMPERATURE_STEP
 from danfoss_ally_scheduler.mqtt_config import MQTTConfig
 
 
@@ -35,14 +36,31 @@ def test_parse_schedule_entry(thermostat_manager):
     }
 
 
+def test_parse_schedule_entry_invalid_input(thermostat_manager):
+    assert thermostat_manager._parse_schedule_entry("8.30", "21.5") is None
+    assert thermostat_manager._parse_schedule_entry("08:30", "40") is None
+
+
 def test_parse_schedule_entry_invalid_time(thermostat_manager):
     with pytest.raises(ValueError, match="Time must be in format HH:MM"):
-        thermostat_manager._parse_schedule_entry("25:00", "21.5")
+        thermostat_manager._parse_schedule_entry_strict("25:00", "21.5")
+    with pytest.raises(ValueError, match="Time must be in format HH:MM"):
+        thermostat_manager._parse_schedule_entry_strict("-1:00", "21.5")
 
 
 def test_parse_schedule_entry_invalid_temperature(thermostat_manager):
     with pytest.raises(ValueError, match="Invalid input format"):
-        thermostat_manager._parse_schedule_entry("08:30", "invalid")
+        thermostat_manager._parse_schedule_entry_strict("08:30", "invalid")
+
+
+def test_parse_schedule_entry_invalid_temperature_step(thermostat_manager):
+    with pytest.raises(ValueError, match="Invalid input format"):
+        thermostat_manager._parse_schedule_entry_strict("08:30", "20.1")
+
+
+def test_parse_schedule_entry_temperature_finer_than_hundredths(thermostat_manager):
+    assert thermostat_manager._parse_schedule_entry("08:30", "21.504") is None
+    assert thermostat_manager._parse_schedule_entry("08:30", "20.004") is None
 
 
 def test_prepare_schedule_payload(thermostat_manager):
@@ -81,11 +99,37 @@ def test_send_schedule_to_thermostats(thermostat_manager):
     assert mock_publish.call_count == 2
     
     # Optionally, we can also check the exact calls
-    expected_calls = [
-        ((f"zigbee2mqtt/{thermostat}/set", '{\n  "test": "payload"\n}'), {})
-        for thermostat in selected_thermostats
-    ]
-    mock_publish.assert_has_calls(expected_calls)
+    topics = [call.args[0] for call in mock_publish.call_args_list]
+    assert topics == [f"zigbee2mqtt/{thermostat}/set" for thermostat in selected_thermostats]
+    for call in mock_publish.call_args_list:
+        assert json.loads(call.args[1]) == payload
+
+
+def test_send_schedule_waits_for_publish(thermostat_manager):
+    thermostat_manager.dry_run = False
+    delivered = Mock(is_published=Mock(return_value=True))
+    failed = Mock(is_published=Mock(return_value=False))
+    failed.wait_for_publish.side_effect = RuntimeError("Message publish failed")
+    thermostat_manager.client.publish.side_effect = [delivered, failed]
+
+    with patch('builtins.print') as mock_print:
+        thermostat_manager._send_schedule_to_thermostats(["thermostat1", "thermostat2"], {"test": "payload"})
+
+    delivered.wait_for_publish.assert_called_once()
+    failed.wait_for_publish.assert_called_once()
+    mock_print.assert_called_with("Failed to send schedule to thermostat2")
+
+
+def test_send_schedule_serializes_payload_once(thermostat_manager):
+    mock_publish = thermostat_manager.client.publish
+    mock_publish.return_value = Mock(is_published=lambda: True)
+
+    with patch('danfoss_ally_scheduler.thermostat_manager.json_dumps', wraps=json_dumps) as mock_dumps:
+        thermostat_manager._send_schedule_to_thermostats(["thermostat1", "thermostat2", "thermostat3"], {"test": "payload"})
+
+    mock_dumps.assert_called_once_with({"test": "payload"})
+    payloads = [call.args[1] for call in mock_publish.call_args_list]
+    assert all(payload is payloads[0] for payload in payloads)
 
 
 def test_select_days_empty_input(thermostat_manager):
@@ -100,6 +144,13 @@ def test_select_days_invalid_input(thermostat_manager):
         assert result == []
 
 
+def test_select_days(thermostat_manager):
+    with patch('builtins.input', return_value="1, 3,2,9"), patch('builtins.print') as mock_print:
+        result = thermostat_manager._select_days(set(["Monday", "Tuesday"]))
+        assert result == ["Monday", "Tuesday"]
+        mock_print.assert_called_with("Invalid day numbers: 3, 9")
+
+
 def test_select_thermostats_empty_list(thermostat_manager):
     thermostat_manager.thermostats = []
     result = thermostat_manager._select_thermostats()
@@ -159,7 +210,9 @@ thermostats:
     mock_publish.assert_called_once()
     call_args = mock_publish.call_args[0]
     assert "thermostat1" in call_args[0]
-    assert '"dayofweek": 5' in call_args[1]  # 5 = binary 101 (Monday + Wednesday)
+    payload = json.loads(call_args[1])["command"]["payload"]
+    assert payload["dayofweek"] == 5  # 5 = binary 101 (Monday + Wednesday)
+    assert payload["transitions"] == [{"transitionTime": 510, "heatSetpoint": 2150}]
 
 
 def test_load_and_apply_schedule_file_not_found(thermostat_manager, tmp_path):
@@ -167,3 +220,77 @@ def test_load_and_apply_schedule_file_not_found(thermostat_manager, tmp_path):
     with patch('builtins.print') as mock_print:
         thermostat_manager.load_and_apply_schedule(str(nonexistent_file))
         mock_print.assert_called_with(f"Configuration file not found: {nonexistent_file}")
+
+
+def test_fetch_thermostats(thermostat_manager):
+    devices = [
+        {"friendly_name": "thermostat1", "definition": {"model": ThermostatManager.MODEL}},
+        {"friendly_name": "plug1", "definition": {"model": "other"}},
+    ]
+    message = Mock(payload=json.dumps(devices).encode())
+    client = thermostat_manager.client
+
+    def subscribe(topic):
+        # Duplicated device lists must not duplicate thermostats
+        client.on_message(client, None, message)
+        client.on_message(client, None, message)
+
+    client.subscribe.side_effect = subscribe
+
+    thermostat_manager.fetch_thermostats()
+
+    assert thermostat_manager.thermostats == ["thermostat1"]
+    assert thermostat_manager._topic_cache == {"thermostat1": "zigbee2mqtt/thermostat1/set"}
+    client.unsubscribe.assert_called_once_with("zigbee2mqtt/bridge/devices")
+
+
+def test_fetch_thermostats_waits_for_expected_count(thermostat_manager):
+    messages = [
+        Mock(payload=json.dumps([{"friendly_name": name, "definition": {"model": ThermostatManager.MODEL}}]).encode())
+        for name in ("thermostat1", "thermostat2")
+    ]
+    client = thermostat_manager.client
+    client.subscribe.side_effect = lambda topic: client.on_message(client, None, messages[0])
+    thermostat_manager.mqtt_config.expected_count = 2
+
+    def wait(event, timeout):
+        # One of the two expected thermostats is not enough to end discovery
+        assert not event.is_set()
+        client.on_message(client, None, messages[1])
+        assert event.is_set()
+        return True
+
+    with patch('threading.Event.wait', autospec=True, side_effect=wait) as mock_wait:
+        thermostat_manager.fetch_thermostats()
+
+    mock_wait.assert_called_once()
+    assert thermostat_manager.thermostats == ["thermostat1", "thermostat2"]
+
+
+def test_configure_schedule_report(thermostat_manager, capsys):
+    thermostat_manager.thermostats = ["thermostat1"]
+    thermostat_manager.client.publish.return_value = Mock(is_published=lambda: True)
+    inputs = iter(["1", "1,2,3,4,5,6,7", "08:30", "21.5", ""])
+
+    with patch('builtins.input', side_effect=lambda _: next(inputs)), \
+            patch.object(thermostat_manager, 'save_schedule_to_yaml') as mock_save:
+        thermostat_manager.configure_schedule()
+
+    output = capsys.readouterr().out
+    assert "Configured days: Monday, Tuesday, Wednesday, Thursday, Friday, Saturday, Sunday\n" in output
+    assert "For thermostats: thermostat1\n" in output
+    report = output.split("Report:")[1]
+    assert "Schedule:\n  08:30: 21.5°C\n" in report
+    assert '"dayofweek"' not in report
+    assert output.count('"dayofweek": 127') == 1
+    mock_save.assert_called_once()
+
+
+def test_disconnect(thermostat_manager):
+    client = thermostat_manager.client
+
+    thermostat_manager.disconnect()
+
+    client.disconnect.assert_called_once()
+    client.loop_stop.assert_called_once()
+    assert thermostat_manager.client is None
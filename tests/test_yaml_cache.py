@@ -0,0 +1,118 @@
+import json
+import os
+from unittest.mock import Mock, patch
+
+import yaml
+
+from danfoss_ally_scheduler.yaml_cache import STREAM_CACHE_SUFFIX, cache_path_for, iter_yaml_cached, load_yaml_cached
+
+
+def _load(f):
+    return yaml.safe_load(f)
+
+
+def test_load_yaml_cached_writes_sidecar(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("mqtt:\n  broker: test.broker\n  port: 1883\n")
+
+    data = load_yaml_cached(config_file, _load)
+
+    assert data == {"mqtt": {"broker": "test.broker", "port": 1883}}
+    cache_file = cache_path_for(config_file)
+    assert cache_file == tmp_path / "config.yaml.cache.json"
+    assert json.loads(cache_file.read_text())["data"] == data
+
+
+def test_load_yaml_cached_uses_sidecar(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("mqtt:\n  broker: test.broker\n")
+    load_yaml_cached(config_file, _load)
+
+    load = Mock()
+    data = load_yaml_cached(config_file, load)
+
+    load.assert_not_called()
+    assert data == {"mqtt": {"broker": "test.broker"}}
+
+
+def test_load_yaml_cached_invalidated_by_change(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("mqtt:\n  broker: test.broker\n")
+    load_yaml_cached(config_file, _load)
+
+    config_file.write_text("mqtt:\n  broker: other.broker\n")
+    stat = os.stat(config_file)
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert load_yaml_cached(config_file, _load) == {"mqtt": {"broker": "other.broker"}}
+
+
+def test_load_yaml_cached_ignores_corrupted_sidecar(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("mqtt:\n  broker: test.broker\n")
+    cache_path_for(config_file).write_text("{not json")
+
+    assert load_yaml_cached(config_file, _load) == {"mqtt": {"broker": "test.broker"}}
+
+
+def _load_all(f):
+    return yaml.safe_load_all(f)
+
+
+def test_iter_yaml_cached_writes_sidecar(tmp_path):
+    schedule_file = tmp_path / "schedule_config.yaml"
+    schedule_file.write_text("\n---\ndays: [Monday]\n\n---\ndays: [Tuesday]\n")
+
+    documents = iter_yaml_cached(schedule_file, _load_all)
+
+    assert next(documents) == {"days": ["Monday"]}
+    cache_file = cache_path_for(schedule_file, STREAM_CACHE_SUFFIX)
+    assert not cache_file.exists()
+    assert list(documents) == [{"days": ["Tuesday"]}]
+    assert cache_file.read_text().splitlines()[1:] == ['{"days": ["Monday"]}', '{"days": ["Tuesday"]}']
+
+
+def test_iter_yaml_cached_uses_sidecar(tmp_path):
+    schedule_file = tmp_path / "schedule_config.yaml"
+    schedule_file.write_text("\n---\ndays: [Monday]\n\n---\ndays: [Tuesday]\n")
+    list(iter_yaml_cached(schedule_file, _load_all))
+
+    load_all = Mock()
+    documents = list(iter_yaml_cached(schedule_file, load_all))
+
+    load_all.assert_not_called()
+    assert documents == [{"days": ["Monday"]}, {"days": ["Tuesday"]}]
+
+
+def test_iter_yaml_cached_discards_partial_sidecar(tmp_path):
+    schedule_file = tmp_path / "schedule_config.yaml"
+    schedule_file.write_text("\n---\ndays: [Monday]\n\n---\ndays: [Tuesday]\n")
+
+    documents = iter_yaml_cached(schedule_file, _load_all)
+    next(documents)
+    documents.close()
+
+    assert list(tmp_path.iterdir()) == [schedule_file]
+
+
+def test_sidecars_keep_yaml_file_permissions(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("mqtt:\n  password: secret\n")
+    config_file.chmod(0o600)
+    schedule_file = tmp_path / "schedule_config.yaml"
+    schedule_file.write_text("\n---\ndays: [Monday]\n")
+    schedule_file.chmod(0o600)
+    # A leftover world-readable sidecar must not keep its permissions
+    cache_path_for(config_file).write_text("{}")
+    cache_path_for(config_file).chmod(0o644)
+
+    with patch('os.chmod') as mock_chmod:
+        load_yaml_cached(config_file, _load)
+        list(iter_yaml_cached(schedule_file, _load_all))
+
+    mock_chmod.assert_not_called()
+    assert cache_path_for(config_file).stat().st_mode & 0o777 == 0o600
+    assert cache_path_for(schedule_file, STREAM_CACHE_SUFFIX).stat().st_mode & 0o777 == 0o600
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "config.yaml", "config.yaml.cache.json", "schedule_config.yaml", "schedule_config.yaml.cache.jsonl"
+    ]